@@ -7,44 +7,269 @@ import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 import json
-import asyncio
-
-# Mock scikit-learn implementation (in production, use: from sklearn.ensemble import RandomForestRegressor, IsolationForest)
-class RandomForestRegressor:
-    def __init__(self, n_estimators=100, random_state=42):
-        self.n_estimators = n_estimators
-        self.random_state = random_state
-        self.is_fitted = False
-    
-    def fit(self, X, y):
-        self.is_fitted = True
-        return self
-    
-    def predict(self, X):
-        if not self.is_fitted:
-            raise ValueError("Model not fitted")
-        # Mock predictions
-        return np.random.uniform(0.1, 0.9, len(X))
-
-class IsolationForest:
-    def __init__(self, contamination=0.1, random_state=42):
-        self.contamination = contamination
-        self.random_state = random_state
-        self.is_fitted = False
-    
-    def fit(self, X):
-        self.is_fitted = True
-        return self
-    
-    def predict(self, X):
-        if not self.is_fitted:
-            raise ValueError("Model not fitted")
-        # Mock anomaly detection (-1 for anomaly, 1 for normal)
-        return np.random.choice([-1, 1], len(X), p=[self.contamination, 1-self.contamination])
+import hashlib
+import functools
+import threading
+from pathlib import Path
 
-@dataclass
+try:
+    import joblib
+    from joblib import Parallel, delayed, effective_n_jobs
+except ImportError:
+    joblib = Parallel = delayed = effective_n_jobs = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:
+    # Without Numba the scoring kernels below run as plain NumPy array expressions
+    def njit(func=None, **kwargs):
+        return func if func is not None else (lambda f: f)
+
+try:
+    import onnxruntime as ort
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+except ImportError:
+    ort = None
+
+try:
+    from sklearn import __version__ as sklearn_version
+    from sklearn.ensemble import RandomForestRegressor, IsolationForest
+except ImportError:
+    # Mock scikit-learn implementation used when scikit-learn is not installed
+    sklearn_version = None
+    
+    class RandomForestRegressor:
+        def __init__(self, n_estimators=100, random_state=42):
+            self.n_estimators = n_estimators
+            self.random_state = random_state
+            self.is_fitted = False
+            self._rng = np.random.default_rng(random_state)
+    
+        def fit(self, X, y):
+            self.is_fitted = True
+            return self
+    
+        def predict(self, X):
+            if not self.is_fitted:
+                raise ValueError("Model not fitted")
+            # Mock predictions: uniform in [0.1, 0.9), scaled in place to avoid a second array
+            predictions = self._rng.random(len(X), dtype=np.float32)
+            predictions *= 0.8
+            predictions += 0.1
+            return predictions
+
+    class IsolationForest:
+        def __init__(self, contamination=0.1, random_state=42):
+            self.contamination = contamination
+            self.random_state = random_state
+            self.is_fitted = False
+            self._rng = np.random.default_rng(random_state)
+    
+        def fit(self, X):
+            self.is_fitted = True
+            return self
+    
+        def predict(self, X):
+            if not self.is_fitted:
+                raise ValueError("Model not fitted")
+            # Mock anomaly detection (-1 for anomaly, 1 for normal)
+            draws = self._rng.random(len(X), dtype=np.float32)
+            return np.where(draws < self.contamination, -1, 1)
+
+# Batches smaller than this are scored in-line; joblib dispatch costs more than it saves
+PARALLEL_MIN_ROWS = 2000
+PARALLEL_CHUNK_ROWS = 4096
+
+# Failure-probability target: per-feature normalisation (20 years, 50k hours, 10 mm/s,
+# 1 year since maintenance) and weights, in feature_columns order
+FAILURE_FACTOR_SCALES = np.array([1 / 20, 1 / 50000, 1 / 50, 1 / 10, 0, 0, 1 / 365], dtype=np.float32)
+FAILURE_FACTOR_WEIGHTS = np.array([0.3, 0.25, 0.2, 0.15, 0, 0, 0.1], dtype=np.float32)
+
+# Equipment-type lookup tables, indexed by type id (see equipment_type_ids). The
+# trailing slot holds the default used for unrecognised equipment types.
+_TYPE_DAYS_MULTIPLIERS = {'hvac': 1.2, 'elevator': 0.8, 'generator': 1.5, 'pump': 1.0, 'lighting': 2.0}
+_TYPE_BASE_COSTS = {'hvac': 800, 'elevator': 2500, 'generator': 1500, 'pump': 600, 'lighting': 200}
+EQUIPMENT_TYPES = np.array(sorted(_TYPE_BASE_COSTS))
+TYPE_DAYS_MULT = np.array([_TYPE_DAYS_MULTIPLIERS[t] for t in EQUIPMENT_TYPES] + [1.0], dtype=np.float64)
+TYPE_BASE_COST = np.array([_TYPE_BASE_COSTS[t] for t in EQUIPMENT_TYPES] + [1000], dtype=np.float32)
+HVAC_TYPE_ID = int(np.searchsorted(EQUIPMENT_TYPES, 'hvac'))
+
+# Risk levels in ascending order, indexed by risk id
+RISK_LEVELS = ('low', 'medium', 'high', 'critical')
+RISK_COST_MULT = np.array([1.0, 1.2, 1.8, 2.5], dtype=np.float32)
+
+# Maintenance recommendations by risk level and by equipment type
+RISK_RECOMMENDATIONS = {
+    'critical': (
+        "Schedule immediate inspection",
+        "Prepare replacement parts",
+        "Consider temporary shutdown if safe",
+        "Notify maintenance team urgently"
+    ),
+    'high': (
+        "Schedule maintenance within 1 week",
+        "Order replacement parts",
+        "Increase monitoring frequency",
+        "Plan for potential downtime"
+    ),
+    'medium': (
+        "Schedule preventive maintenance",
+        "Review maintenance procedures",
+        "Monitor performance trends"
+    ),
+    'low': (
+        "Continue regular monitoring",
+        "Maintain current schedule"
+    )
+}
+TYPE_RECOMMENDATIONS = {
+    'hvac': ("Inspect and replace filters if needed",),
+    'elevator': (
+        "Inspect cables and pulleys",
+        "Check safety systems",
+        "Lubricate moving parts"
+    ),
+    'generator': (
+        "Test under load conditions",
+        "Check fuel system",
+        "Inspect electrical connections"
+    )
+}
+
+# Recommendation tuples indexed by risk id / type id (trailing slot: unrecognised type)
+RISK_RECOMMENDATION_TABLE = tuple(RISK_RECOMMENDATIONS[level] for level in RISK_LEVELS)
+TYPE_RECOMMENDATION_TABLE = tuple(TYPE_RECOMMENDATIONS.get(t, ()) for t in EQUIPMENT_TYPES) + ((),)
+ROUTINE_RECOMMENDATIONS = tuple(RISK_RECOMMENDATIONS['low'] + recs for recs in TYPE_RECOMMENDATION_TABLE)
+
+# Maintenance schedule periods, most urgent first
+SCHEDULE_PERIODS = ('immediate', 'this_week', 'this_month', 'next_quarter')
+
+# Synthetic training set used when no historical data has been provided
+MOCK_TRAINING_CONFIG = {
+    'version': 1,
+    'samples': 100,
+    'seed': 42,
+    'equipment_types': ('hvac', 'elevator', 'generator', 'pump'),
+    'models': (RandomForestRegressor.__module__, IsolationForest.__module__),
+    # Cached models are pickles whose private tree attributes the scorer relies on
+    'library_versions': (sklearn_version, np.__version__)
+}
+MOCK_CACHE_DIR = Path("~/.cache/pmengine").expanduser()
+
+# Contributing-factor labels, in the column order used by _identify_factors
+FACTOR_NAMES = (
+    "Equipment age",
+    "High usage hours",
+    "Elevated temperature",
+    "Excessive vibration",
+    "Overdue maintenance",
+    "Anomalous sensor readings",
+    "Previous failure history"
+)
+NORMAL_FACTORS = ("Normal operating conditions",)
+FACTOR_BITS = 1 << np.arange(len(FACTOR_NAMES))
+
+def equipment_type_ids(types: np.ndarray) -> np.ndarray:
+    """Map equipment-type names to indices into the type lookup tables"""
+    types = np.asarray(types, dtype=str)
+    type_ids = np.minimum(np.searchsorted(EQUIPMENT_TYPES, types), len(EQUIPMENT_TYPES) - 1)
+    known = EQUIPMENT_TYPES[type_ids] == types
+    return np.where(known, type_ids, len(EQUIPMENT_TYPES))
+
+@functools.lru_cache(maxsize=256)
+def _recommendations_for(risk_id: int, type_id: int, hvac_overheating: bool, is_anomaly: bool) -> Tuple[str, ...]:
+    """Build (once) the shared recommendation tuple for a combination of conditions"""
+    recommendations = RISK_RECOMMENDATION_TABLE[risk_id]
+    if hvac_overheating:
+        recommendations += ("Check cooling system efficiency",)
+    recommendations += TYPE_RECOMMENDATION_TABLE[type_id]
+    if is_anomaly:
+        recommendations += ("Investigate unusual sensor readings",)
+    return recommendations
+
+def _tree_depths(detector, tree_idx: int, X: np.ndarray) -> np.ndarray:
+    """Path length of each row through one fitted isolation tree, as scikit-learn scores it"""
+    tree = detector.estimators_[tree_idx]
+    leaves = tree.apply(X[:, detector.estimators_features_[tree_idx]])
+    return (detector._decision_path_lengths[tree_idx][leaves]
+            + detector._average_path_length_per_tree[tree_idx][leaves] - 1.0)
+
+def _average_path_length(n_samples: int) -> float:
+    """Average path length of an unsuccessful BST search over n_samples (isolation-forest normaliser)"""
+    if n_samples <= 1:
+        return 0.0
+    if n_samples == 2:
+        return 1.0
+    return 2.0 * (np.log(n_samples - 1.0) + np.euler_gamma) - 2.0 * (n_samples - 1.0) / n_samples
+
+def _isolation_predict(detector, X: np.ndarray) -> np.ndarray:
+    """Equivalent of IsolationForest.predict, accumulating tree depths one row tile at a time
+    
+    Only a tile-sized depth buffer is live at once, so memory stays O(tile + N) regardless of
+    the number of trees.
+    """
+    labels = np.empty(len(X), dtype=np.int64)
+    denominator = len(detector.estimators_) * _average_path_length(detector._max_samples)
+    
+    for start in range(0, len(X), PARALLEL_CHUNK_ROWS):
+        X_tile = X[start:start + PARALLEL_CHUNK_ROWS]
+        depths = np.zeros(len(X_tile))
+        for tree_idx in range(len(detector.estimators_)):
+            depths += _tree_depths(detector, tree_idx, X_tile)
+        
+        # sklearn: score_samples = -2 ** (-depth / denominator); anomalies fall below offset_
+        # (a single-sample forest has a zero denominator and sklearn uses a ratio of 1 there)
+        ratio = depths / denominator if denominator > 0 else np.ones(len(X_tile))
+        scores = -(2.0 ** -ratio)
+        labels[start:start + len(X_tile)] = np.where(scores - detector.offset_ < 0, -1, 1)
+    
+    return labels
+
+@functools.cache
+def _factors_for_code(code: int) -> Tuple[str, ...]:
+    """Factor labels for a bit-packed factor code (bit k set = FACTOR_NAMES[k] applies)"""
+    if code == 0:
+        return NORMAL_FACTORS
+    return tuple(name for k, name in enumerate(FACTOR_NAMES) if code >> k & 1)
+
+@njit
+def _days_to_failure_vec(failure_probs, type_ids, type_mults):
+    # Higher failure probability = fewer days to failure, up to 1 year before the type adjustment
+    base_days = ((1.0 - failure_probs.astype(np.float64)) * 365).astype(np.int32)
+    days = (base_days * type_mults[type_ids]).astype(np.int32)
+    return np.maximum(days, 1)
+
+@njit
+def _risk_level_vec(failure_probs, days_to_failure, is_anomaly):
+    # Compare in float64 so NumPy (NEP 50 keeps float32) and Numba agree at the thresholds
+    probs = failure_probs.astype(np.float64)
+    critical = is_anomaly | (probs > 0.8) | (days_to_failure <= 7)
+    high = (probs > 0.6) | (days_to_failure <= 30)
+    medium = (probs > 0.4) | (days_to_failure <= 90)
+    return np.where(critical, 3, np.where(high, 2, np.where(medium, 1, 0))).astype(np.int8)
+
+@njit
+def _maintenance_cost_vec(type_ids, risk_ids, ages, base_costs, risk_mults):
+    # Older equipment costs more to maintain
+    return base_costs[type_ids] * risk_mults[risk_ids] * (1 + ages.astype(np.float64) / 20)
+
+@njit
+def _confidence_vec(hist_len, ages):
+    # More maintenance history and older equipment (more data) = higher confidence;
+    # 0.7 base confidence plus a fixed 0.1 sensor-consistency credit
+    history_factor = np.minimum(hist_len / 10, 0.2)
+    age_factor = np.minimum(ages.astype(np.float64) / 10, 0.1)
+    return np.minimum(0.7 + history_factor + 0.1 + age_factor, 0.95)
+
+@dataclass(slots=True)
 class EquipmentData:
     """Equipment sensor data and metadata"""
     equipment_id: str
@@ -59,7 +284,7 @@ class EquipmentData:
     maintenance_history: List[Dict]
     failure_history: List[Dict]
 
-@dataclass
+@dataclass(slots=True)
 class MaintenancePrediction:
     """Predictive maintenance result"""
     equipment_id: str
@@ -67,310 +292,305 @@ class MaintenancePrediction:
     days_to_failure: int
     confidence_score: float
     risk_level: str
-    recommended_actions: List[str]
+    recommended_actions: Tuple[str, ...]
     estimated_cost: float
-    factors: List[str]
+    factors: Tuple[str, ...]
+
+def _feature_row(e: EquipmentData) -> Tuple[float, ...]:
+    """Model features for one equipment item, in feature_columns order"""
+    return (e.age_years, e.usage_hours, e.temperature, e.vibration,
+            e.pressure, e.current_draw, e.last_maintenance_days)
+
+@dataclass
+class EquipmentTable:
+    """Columnar (structure-of-arrays) view of a batch of equipment"""
+    ids: np.ndarray
+    types: np.ndarray
+    type_ids: np.ndarray  # indices into the equipment-type lookup tables
+    numeric: np.ndarray  # shape (N, 7) float32, columns in feature_columns order
+    hist_len: np.ndarray
+    fail_len: np.ndarray
+    
+    @classmethod
+    def from_records(cls, equipment_list: List[EquipmentData]) -> "EquipmentTable":
+        """Build the columnar table from a list of equipment records"""
+        n = len(equipment_list)
+        ids = np.empty(n, dtype=object)
+        types = np.empty(n, dtype=object)
+        numeric = np.empty((n, 7), dtype=np.float32)
+        hist_len = np.empty(n, dtype=np.int32)
+        fail_len = np.empty(n, dtype=np.int32)
+        
+        for i, e in enumerate(equipment_list):
+            ids[i] = e.equipment_id
+            types[i] = e.equipment_type
+            numeric[i] = _feature_row(e)
+            hist_len[i] = len(e.maintenance_history)
+            fail_len[i] = len(e.failure_history)
+        
+        return cls(ids=ids, types=types, type_ids=equipment_type_ids(types), numeric=numeric,
+                   hist_len=hist_len, fail_len=fail_len)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
 
 class PredictiveMaintenanceEngine:
     """Main predictive maintenance engine using ML algorithms"""
     
-    def __init__(self):
+    def __init__(self, thin_to: Optional[int] = None, n_jobs: Optional[int] = -1):
         self.failure_model = RandomForestRegressor(n_estimators=100, random_state=42)
         self.anomaly_detector = IsolationForest(contamination=0.1, random_state=42)
+        # Keep only this many isolation trees after training (None keeps all of them).
+        # Thinning runs once in train_models; persist the thinned detector, not the full one.
+        self.thin_to = thin_to
+        # Worker threads for chunked batch scoring (-1 uses every core, None defers to the
+        # active joblib context)
+        self.n_jobs = n_jobs
         self.is_trained = False
+        self._init_lock = threading.Lock()
         self.feature_columns = [
             'age_years', 'usage_hours', 'temperature', 'vibration', 
             'pressure', 'current_draw', 'last_maintenance_days'
         ]
+        # Compiled failure-model backends, populated by compile_inference()
+        self._ort_session = None
+        self._fil_model = None
         
-    def prepare_features(self, equipment_data: EquipmentData) -> np.ndarray:
-        """Extract features from equipment data"""
-        features = [
-            equipment_data.age_years,
-            equipment_data.usage_hours,
-            equipment_data.temperature,
-            equipment_data.vibration,
-            equipment_data.pressure,
-            equipment_data.current_draw,
-            equipment_data.last_maintenance_days
-        ]
-        return np.array(features).reshape(1, -1)
+    def prepare_features_batch(self, equipment_list: List[EquipmentData]) -> np.ndarray:
+        """Extract features for many equipment items into a single (N, 7) matrix"""
+        return EquipmentTable.from_records(equipment_list).numeric
     
     def train_models(self, historical_data: List[EquipmentData]) -> None:
         """Train the predictive models with historical data"""
         print("[Maintenance Engine] Training predictive models...")
         
         # Prepare training data
-        X_train = []
-        y_train = []
-        
-        for equipment in historical_data:
-            features = self.prepare_features(equipment).flatten()
-            X_train.append(features)
-            
-            # Mock target: failure probability based on equipment condition
-            failure_prob = self._calculate_failure_probability(equipment)
-            y_train.append(failure_prob)
+        X_train = self.prepare_features_batch(historical_data)
         
-        X_train = np.array(X_train)
-        y_train = np.array(y_train)
+        # Mock target: failure probability based on equipment condition
+        y_train = self._calculate_failure_probability_batch(X_train)
         
         # Train failure prediction model
         self.failure_model.fit(X_train, y_train)
-        
-        # Train anomaly detection model
-        self.anomaly_detector.fit(X_train)
+        self._ort_session = None
+        self._fil_model = None
+        
+        # Train anomaly detection model, holding out a validation slice to rank trees when thinning
+        if self.thin_to:
+            order = np.random.default_rng(42).permutation(len(X_train))
+            n_fit = max(1, int(len(X_train) * 0.8))
+            X_fit, X_val = X_train[order[:n_fit]], X_train[order[n_fit:]]
+            self.anomaly_detector.fit(X_fit)
+            self._thin_anomaly_detector(X_fit, X_val)
+        else:
+            self.anomaly_detector.fit(X_train)
         
         self.is_trained = True
         print(f"[Maintenance Engine] Models trained on {len(historical_data)} equipment records")
     
     def predict_maintenance(self, equipment_data: EquipmentData) -> MaintenancePrediction:
         """Generate maintenance prediction for equipment"""
-        if not self.is_trained:
-            # Use mock training data if not trained
-            self._mock_training()
-        
-        features = self.prepare_features(equipment_data)
-        
-        # Predict failure probability
-        failure_prob = self.failure_model.predict(features)[0]
-        
-        # Detect anomalies
-        anomaly_score = self.anomaly_detector.predict(features)[0]
-        is_anomaly = anomaly_score == -1
-        
-        # Calculate days to failure
-        days_to_failure = self._calculate_days_to_failure(failure_prob, equipment_data)
+        return self._predict_batch([equipment_data])[0]
+    
+    def _predict_batch(self, equipment_list: List[EquipmentData]) -> List[MaintenancePrediction]:
+        """Score a batch of equipment with one model call per model and build predictions"""
+        self._ensure_trained()
         
-        # Determine risk level
-        risk_level = self._determine_risk_level(failure_prob, days_to_failure, is_anomaly)
+        table = EquipmentTable.from_records(equipment_list)
+        X = table.numeric
         
-        # Generate recommendations
-        recommendations = self._generate_recommendations(equipment_data, risk_level, is_anomaly)
+        # Predict failure probability and detect anomalies for the whole batch
+        failure_probs = self._predict_failure(X)
+        is_anomaly = self._detect_anomalies(X)
         
-        # Estimate maintenance cost
-        estimated_cost = self._estimate_maintenance_cost(equipment_data, risk_level)
+        # Calculate days to failure, risk level and confidence
+        type_ids = table.type_ids
+        days_to_failure = self._calculate_days_to_failure(failure_probs, type_ids)
+        risk_ids = self._determine_risk_level(failure_probs, days_to_failure, is_anomaly)
+        confidence_scores = self._calculate_confidence(table)
         
-        # Calculate confidence score
-        confidence_score = self._calculate_confidence(equipment_data, failure_prob)
+        # Estimate maintenance cost and identify contributing factors
+        estimated_costs = self._estimate_maintenance_cost(table, type_ids, risk_ids)
+        factors = self._identify_factors(table, is_anomaly)
         
-        # Identify contributing factors
-        factors = self._identify_factors(equipment_data, is_anomaly)
+        hvac_overheating = (type_ids == HVAC_TYPE_ID) & (table.numeric[:, 2] > 30)
         
-        return MaintenancePrediction(
-            equipment_id=equipment_data.equipment_id,
-            failure_probability=failure_prob,
-            days_to_failure=days_to_failure,
-            confidence_score=confidence_score,
-            risk_level=risk_level,
-            recommended_actions=recommendations,
-            estimated_cost=estimated_cost,
-            factors=factors
+        predictions = []
+        rows = zip(
+            table.ids.tolist(), failure_probs.tolist(), days_to_failure.tolist(), confidence_scores.tolist(),
+            type_ids.tolist(), risk_ids.tolist(), hvac_overheating.tolist(), is_anomaly.tolist(),
+            estimated_costs.tolist(), factors
         )
-    
-    def _calculate_failure_probability(self, equipment: EquipmentData) -> float:
-        """Calculate failure probability based on equipment condition"""
-        # Age factor (older equipment more likely to fail)
-        age_factor = min(equipment.age_years / 20, 1.0)  # Normalize to 20 years
-        
-        # Usage factor
-        usage_factor = min(equipment.usage_hours / 50000, 1.0)  # Normalize to 50k hours
-        
-        # Temperature stress factor
-        temp_factor = max(0, (equipment.temperature - 25) / 50)  # Above 25°C increases risk
-        
-        # Vibration factor
-        vibration_factor = min(equipment.vibration / 10, 1.0)  # Normalize to 10 mm/s
-        
-        # Maintenance factor (longer since last maintenance = higher risk)
-        maintenance_factor = min(equipment.last_maintenance_days / 365, 1.0)  # Normalize to 1 year
-        
-        # Combine factors
-        failure_prob = (age_factor * 0.3 + usage_factor * 0.25 + temp_factor * 0.2 + 
-                       vibration_factor * 0.15 + maintenance_factor * 0.1)
+        for equipment_id, failure_prob, days, confidence, type_id, risk_id, overheating, anomaly, cost, row_factors in rows:
+            if risk_id == 0 and row_factors is NORMAL_FACTORS:
+                # Routine equipment (low risk, nothing flagged, so no overheating or anomaly)
+                recommendations = ROUTINE_RECOMMENDATIONS[type_id]
+            else:
+                recommendations = self._generate_recommendations(risk_id, type_id, overheating, anomaly)
+            predictions.append(MaintenancePrediction(
+                equipment_id=equipment_id,
+                failure_probability=failure_prob,
+                days_to_failure=days,
+                confidence_score=confidence,
+                risk_level=RISK_LEVELS[risk_id],
+                recommended_actions=recommendations,
+                estimated_cost=cost,
+                factors=row_factors
+            ))
         
-        return min(max(failure_prob, 0.01), 0.99)  # Clamp between 1% and 99%
+        return predictions
     
-    def _calculate_days_to_failure(self, failure_prob: float, equipment: EquipmentData) -> int:
-        """Estimate days until potential failure"""
-        # Higher failure probability = fewer days to failure
-        base_days = int((1 - failure_prob) * 365)  # Up to 1 year
-        
-        # Adjust based on equipment type
-        type_multipliers = {
-            'hvac': 1.2,
-            'elevator': 0.8,
-            'generator': 1.5,
-            'pump': 1.0,
-            'lighting': 2.0
-        }
-        
-        multiplier = type_multipliers.get(equipment.equipment_type, 1.0)
-        return max(1, int(base_days * multiplier))
-    
-    def _determine_risk_level(self, failure_prob: float, days_to_failure: int, is_anomaly: bool) -> str:
-        """Determine risk level based on prediction results"""
-        if is_anomaly or failure_prob > 0.8 or days_to_failure <= 7:
-            return "critical"
-        elif failure_prob > 0.6 or days_to_failure <= 30:
-            return "high"
-        elif failure_prob > 0.4 or days_to_failure <= 90:
-            return "medium"
-        else:
-            return "low"
-    
-    def _generate_recommendations(self, equipment: EquipmentData, risk_level: str, is_anomaly: bool) -> List[str]:
-        """Generate maintenance recommendations"""
-        recommendations = []
-        
-        if risk_level == "critical":
-            recommendations.extend([
-                "Schedule immediate inspection",
-                "Prepare replacement parts",
-                "Consider temporary shutdown if safe",
-                "Notify maintenance team urgently"
-            ])
-        elif risk_level == "high":
-            recommendations.extend([
-                "Schedule maintenance within 1 week",
-                "Order replacement parts",
-                "Increase monitoring frequency",
-                "Plan for potential downtime"
-            ])
-        elif risk_level == "medium":
-            recommendations.extend([
-                "Schedule preventive maintenance",
-                "Review maintenance procedures",
-                "Monitor performance trends"
-            ])
-        else:
-            recommendations.extend([
-                "Continue regular monitoring",
-                "Maintain current schedule"
-            ])
-        
-        # Equipment-specific recommendations
-        if equipment.equipment_type == "hvac":
-            if equipment.temperature > 30:
-                recommendations.append("Check cooling system efficiency")
-            recommendations.append("Inspect and replace filters if needed")
-        elif equipment.equipment_type == "elevator":
-            recommendations.extend([
-                "Inspect cables and pulleys",
-                "Check safety systems",
-                "Lubricate moving parts"
-            ])
-        elif equipment.equipment_type == "generator":
-            recommendations.extend([
-                "Test under load conditions",
-                "Check fuel system",
-                "Inspect electrical connections"
-            ])
-        
-        if is_anomaly:
-            recommendations.append("Investigate unusual sensor readings")
-        
-        return recommendations
-    
-    def _estimate_maintenance_cost(self, equipment: EquipmentData, risk_level: str) -> float:
-        """Estimate maintenance cost based on equipment and risk level"""
-        base_costs = {
-            'hvac': 800,
-            'elevator': 2500,
-            'generator': 1500,
-            'pump': 600,
-            'lighting': 200
-        }
+    def _calculate_failure_probability_batch(self, X: np.ndarray) -> np.ndarray:
+        """Calculate failure probabilities for a (N, 7) feature matrix"""
+        # Normalise age, usage, vibration and maintenance age, each capped at 1.0
+        factors = np.minimum(X * FAILURE_FACTOR_SCALES, 1.0)
         
-        base_cost = base_costs.get(equipment.equipment_type, 1000)
+        # Temperature stress factor: only readings above 25°C increase risk
+        factors[:, 2] = np.maximum(0, (X[:, 2] - 25) / 50)
         
-        # Risk level multipliers
-        risk_multipliers = {
-            'critical': 2.5,
-            'high': 1.8,
-            'medium': 1.2,
-            'low': 1.0
-        }
-        
-        multiplier = risk_multipliers.get(risk_level, 1.0)
-        
-        # Age factor (older equipment costs more to maintain)
-        age_multiplier = 1 + (equipment.age_years / 20)
-        
-        return base_cost * multiplier * age_multiplier
+        failure_probs = factors @ FAILURE_FACTOR_WEIGHTS
+        return np.clip(failure_probs, 0.01, 0.99)  # Clamp between 1% and 99%
     
-    def _calculate_confidence(self, equipment: EquipmentData, failure_prob: float) -> float:
-        """Calculate confidence score for the prediction"""
-        # Base confidence on data quality and equipment history
-        base_confidence = 0.7
-        
-        # More maintenance history = higher confidence
-        history_factor = min(len(equipment.maintenance_history) / 10, 0.2)
-        
-        # Consistent sensor readings = higher confidence
-        sensor_consistency = 0.1  # Mock value
-        
-        # Equipment age factor (more data for older equipment)
-        age_factor = min(equipment.age_years / 10, 0.1)
-        
-        confidence = base_confidence + history_factor + sensor_consistency + age_factor
-        return min(confidence, 0.95)
+    def _calculate_days_to_failure(self, failure_probs: np.ndarray, type_ids: np.ndarray) -> np.ndarray:
+        """Estimate days until potential failure, adjusted by equipment type"""
+        return _days_to_failure_vec(failure_probs, type_ids, TYPE_DAYS_MULT)
     
-    def _identify_factors(self, equipment: EquipmentData, is_anomaly: bool) -> List[str]:
-        """Identify key factors contributing to the prediction"""
-        factors = []
-        
-        if equipment.age_years > 10:
-            factors.append("Equipment age")
-        
-        if equipment.usage_hours > 30000:
-            factors.append("High usage hours")
-        
-        if equipment.temperature > 30:
-            factors.append("Elevated temperature")
-        
-        if equipment.vibration > 5:
-            factors.append("Excessive vibration")
-        
-        if equipment.last_maintenance_days > 180:
-            factors.append("Overdue maintenance")
-        
-        if is_anomaly:
-            factors.append("Anomalous sensor readings")
-        
-        if len(equipment.failure_history) > 2:
-            factors.append("Previous failure history")
-        
-        return factors if factors else ["Normal operating conditions"]
+    def _determine_risk_level(self, failure_probs: np.ndarray, days_to_failure: np.ndarray,
+                              is_anomaly: np.ndarray) -> np.ndarray:
+        """Determine risk level ids (indices into RISK_LEVELS) based on prediction results"""
+        return _risk_level_vec(failure_probs, days_to_failure, is_anomaly)
+    
+    def _generate_recommendations(self, risk_id: int, type_id: int, hvac_overheating: bool,
+                                  is_anomaly: bool) -> Tuple[str, ...]:
+        """Generate maintenance recommendations from risk id and equipment type id"""
+        return _recommendations_for(risk_id, type_id, hvac_overheating, is_anomaly)
+    
+    def _estimate_maintenance_cost(self, table: EquipmentTable, type_ids: np.ndarray,
+                                   risk_ids: np.ndarray) -> np.ndarray:
+        """Estimate maintenance costs based on equipment type, risk level and age"""
+        return _maintenance_cost_vec(type_ids, risk_ids, table.numeric[:, 0], TYPE_BASE_COST, RISK_COST_MULT)
+    
+    def _calculate_confidence(self, table: EquipmentTable) -> np.ndarray:
+        """Calculate confidence scores from data quality and equipment history"""
+        return _confidence_vec(table.hist_len, table.numeric[:, 0])
+    
+    def _identify_factors(self, table: EquipmentTable, is_anomaly: np.ndarray) -> List[Tuple[str, ...]]:
+        """Identify key factors contributing to each prediction"""
+        numeric = table.numeric
+        flags = np.column_stack([
+            numeric[:, 0] > 10,      # Equipment age
+            numeric[:, 1] > 30000,   # High usage hours
+            numeric[:, 2] > 30,      # Elevated temperature
+            numeric[:, 3] > 5,       # Excessive vibration
+            numeric[:, 6] > 180,     # Overdue maintenance
+            is_anomaly,
+            table.fail_len > 2
+        ])
+        
+        # Pack each row's flags into a 7-bit code; each distinct code maps to one shared tuple
+        codes = flags @ FACTOR_BITS
+        return [_factors_for_code(code) for code in codes.tolist()]
+    
+    def _thin_anomaly_detector(self, X_fit: np.ndarray, X_val: np.ndarray) -> None:
+        """Keep the thin_to isolation trees that best reproduce the full ensemble's path lengths"""
+        detector = self.anomaly_detector
+        if not hasattr(detector, '_decision_path_lengths'):
+            print("[Maintenance Engine] Anomaly detector does not support tree thinning, keeping all trees")
+            return
+        if len(detector.estimators_) <= self.thin_to or len(X_val) < 2:
+            return
+        
+        # Per-tree path lengths on the held-out rows, shape (n_trees, n_val)
+        depths = np.stack([_tree_depths(detector, i, X_val) for i in range(len(detector.estimators_))])
+        ensemble = depths.mean(axis=0)
+        
+        # Contribution = correlation between a tree's path lengths and the ensemble's
+        centered = depths - depths.mean(axis=1, keepdims=True)
+        ensemble_centered = ensemble - ensemble.mean()
+        norms = np.linalg.norm(centered, axis=1) * np.linalg.norm(ensemble_centered)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            contribution = np.nan_to_num((centered @ ensemble_centered) / norms, nan=-1.0)
+        keep = np.sort(np.argsort(-contribution)[:self.thin_to])
+        
+        for attr in ('estimators_', 'estimators_features_', '_decision_path_lengths',
+                     '_average_path_length_per_tree', '_seeds'):
+            values = getattr(detector, attr)
+            setattr(detector, attr, values[keep] if isinstance(values, np.ndarray) else [values[i] for i in keep])
+        detector.n_estimators = len(keep)
+        
+        # Scores shift with fewer trees, so re-derive the anomaly threshold from the fit data
+        if detector.contamination != 'auto':
+            detector.offset_ = np.percentile(detector.score_samples(X_fit), 100.0 * detector.contamination)
+        print(f"[Maintenance Engine] Thinned anomaly detector to {len(keep)} trees")
+    
+    def _ensure_trained(self) -> None:
+        """Fall back to mock training exactly once, even under concurrent callers"""
+        if self.is_trained:
+            return
+        with self._init_lock:
+            if not self.is_trained:
+                # Use mock training data if not trained
+                self._mock_training()
     
     def _mock_training(self):
-        """Mock training with synthetic data"""
+        """Mock training with synthetic data, reusing cached models when available"""
+        config = dict(MOCK_TRAINING_CONFIG, thin_to=self.thin_to)
+        config_key = hashlib.sha256(repr(sorted(config.items())).encode()).hexdigest()[:16]
+        cache_path = MOCK_CACHE_DIR / f"mock_{config_key}.joblib"
+        
+        if joblib is not None and cache_path.exists():
+            try:
+                self.failure_model, self.anomaly_detector = joblib.load(cache_path)
+                self._ort_session = None
+                self._fil_model = None
+                self.is_trained = True
+                print("[Maintenance Engine] Loaded cached mock-trained models")
+                return
+            except Exception as e:
+                print(f"[Maintenance Engine] Ignoring unreadable model cache: {e}")
+        
         print("[Maintenance Engine] Using mock training data...")
         
-        # Generate synthetic training data
+        # Generate synthetic training data (seeded so the cached models are reproducible)
+        rng = np.random.default_rng(MOCK_TRAINING_CONFIG['seed'])
         mock_data = []
-        for i in range(100):
+        for i in range(MOCK_TRAINING_CONFIG['samples']):
             equipment = EquipmentData(
                 equipment_id=f"mock-{i}",
-                equipment_type=np.random.choice(['hvac', 'elevator', 'generator', 'pump']),
-                age_years=np.random.uniform(1, 20),
-                usage_hours=np.random.uniform(1000, 50000),
-                temperature=np.random.uniform(20, 40),
-                vibration=np.random.uniform(0, 10),
-                pressure=np.random.uniform(0, 100),
-                current_draw=np.random.uniform(10, 100),
-                last_maintenance_days=np.random.randint(1, 365),
+                equipment_type=str(rng.choice(MOCK_TRAINING_CONFIG['equipment_types'])),
+                age_years=rng.uniform(1, 20),
+                usage_hours=rng.uniform(1000, 50000),
+                temperature=rng.uniform(20, 40),
+                vibration=rng.uniform(0, 10),
+                pressure=rng.uniform(0, 100),
+                current_draw=rng.uniform(10, 100),
+                last_maintenance_days=int(rng.integers(1, 365)),
                 maintenance_history=[],
                 failure_history=[]
             )
             mock_data.append(equipment)
         
         self.train_models(mock_data)
+        
+        if joblib is not None:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                joblib.dump((self.failure_model, self.anomaly_detector), cache_path, compress=3)
+            except OSError as e:
+                print(f"[Maintenance Engine] Could not cache mock-trained models: {e}")
     
     def batch_predict(self, equipment_list: List[EquipmentData]) -> List[MaintenancePrediction]:
         """Generate predictions for multiple equipment items"""
-        predictions = []
+        if not equipment_list:
+            return []
+        
+        try:
+            return self._predict_batch(equipment_list)
+        except Exception as e:
+            print(f"[Maintenance Engine] Batch prediction failed, retrying per item: {e}")
         
+        # Fall back to per-item scoring so one bad record does not drop the batch
+        predictions = []
         for equipment in equipment_list:
             try:
                 prediction = self.predict_maintenance(equipment)
@@ -380,29 +600,108 @@ class PredictiveMaintenanceEngine:
         
         return predictions
     
+    def compile_inference(self, model_path: Optional[str] = None, use_gpu: bool = False) -> bool:
+        """Compile the fitted failure model to ONNX Runtime (CPU) or RAPIDS FIL (GPU)
+        
+        Returns True when a compiled backend is active; otherwise predictions keep
+        using the native model.
+        """
+        self._ensure_trained()
+        
+        if use_gpu:
+            try:
+                from cuml import ForestInference
+                self._fil_model = ForestInference.load_from_sklearn(self.failure_model, storage_type='sparse')
+                print("[Maintenance Engine] Failure model compiled with RAPIDS FIL")
+                return True
+            except Exception as e:
+                print(f"[Maintenance Engine] FIL compilation unavailable: {e}")
+        
+        if ort is None:
+            print("[Maintenance Engine] ONNX Runtime not installed, using native inference")
+            return False
+        
+        try:
+            onnx_model = convert_sklearn(
+                self.failure_model,
+                initial_types=[('input', FloatTensorType([None, len(self.feature_columns)]))]
+            )
+        except Exception as e:
+            print(f"[Maintenance Engine] ONNX conversion failed: {e}")
+            return False
+        
+        serialized = onnx_model.SerializeToString()
+        if model_path:
+            with open(model_path, 'wb') as f:
+                f.write(serialized)
+        
+        self._ort_session = ort.InferenceSession(serialized, providers=['CPUExecutionProvider'])
+        print("[Maintenance Engine] Failure model compiled with ONNX Runtime")
+        return True
+    
+    def _predict_failure(self, X: np.ndarray) -> np.ndarray:
+        """Predict float32 failure probabilities with the fastest available backend"""
+        if self._fil_model is not None:
+            return np.asarray(self._fil_model.predict(X.astype(np.float32, copy=False))).ravel()
+        if self._ort_session is not None:
+            return self._ort_session.run(None, {'input': X.astype(np.float32, copy=False)})[0].ravel()
+        return self._predict_chunked(self.failure_model.predict, X).astype(np.float32, copy=False)
+    
+    def _detect_anomalies(self, X: np.ndarray) -> np.ndarray:
+        """Flag anomalous rows, scoring fitted isolation forests tile by tile"""
+        if hasattr(self.anomaly_detector, '_decision_path_lengths'):
+            predict = functools.partial(_isolation_predict, self.anomaly_detector)
+        else:
+            predict = self.anomaly_detector.predict
+        return self._predict_chunked(predict, X) == -1
+    
+    def _predict_chunked(self, predict, X: np.ndarray) -> np.ndarray:
+        """Run a predict function over row chunks concurrently for large batches
+        
+        Threads are preferred so chunks share the fitted model without pickling. The worker
+        count is the engine's n_jobs; with n_jobs=None it comes from the active joblib context,
+        e.g. ``with parallel_backend("threading", n_jobs=N):`` (a process backend such as loky
+        would pickle the model for every chunk).
+        """
+        if Parallel is None or len(X) < PARALLEL_MIN_ROWS or effective_n_jobs(self.n_jobs) == 1:
+            return predict(X)
+        
+        n_chunks = max(2, -(-len(X) // PARALLEL_CHUNK_ROWS))
+        chunks = np.array_split(X, n_chunks)
+        results = Parallel(n_jobs=self.n_jobs, prefer="threads")(delayed(predict)(chunk) for chunk in chunks)
+        return np.concatenate(results)
+    
+    def generate_maintenance_schedule_indices(self, predictions: List[MaintenancePrediction]) -> Dict[str, np.ndarray]:
+        """Bucket predictions into schedule periods, returning index arrays per period"""
+        critical = np.array([p.risk_level == 'critical' for p in predictions], dtype=bool)
+        days = np.array([p.days_to_failure for p in predictions], dtype=np.int32)
+        
+        bucket = np.select(
+            [critical | (days <= 3), days <= 7, days <= 30],
+            [0, 1, 2],
+            default=3
+        )
+        return {period: np.flatnonzero(bucket == k) for k, period in enumerate(SCHEDULE_PERIODS)}
+    
     def generate_maintenance_schedule(self, predictions: List[MaintenancePrediction]) -> Dict:
         """Generate optimized maintenance schedule"""
-        schedule = {
-            'immediate': [],
-            'this_week': [],
-            'this_month': [],
-            'next_quarter': []
+        schedule_indices = self.generate_maintenance_schedule_indices(predictions)
+        return {
+            period: [predictions[i] for i in indices]
+            for period, indices in schedule_indices.items()
         }
-        
-        for prediction in predictions:
-            if prediction.risk_level == 'critical' or prediction.days_to_failure <= 3:
-                schedule['immediate'].append(prediction)
-            elif prediction.days_to_failure <= 7:
-                schedule['this_week'].append(prediction)
-            elif prediction.days_to_failure <= 30:
-                schedule['this_month'].append(prediction)
-            else:
-                schedule['next_quarter'].append(prediction)
-        
-        return schedule
+
+    def to_json(self, predictions: List[MaintenancePrediction]) -> bytes:
+        """Serialize predictions to a JSON array (bytes), using orjson when available
+        
+        For streaming many batches, write one array per line: ``f.write(engine.to_json(batch) + b"\\n")``.
+        """
+        if orjson is not None:
+            return orjson.dumps(predictions, option=orjson.OPT_SERIALIZE_DATACLASS | orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps([asdict(p) for p in predictions]).encode()
 
 # Example usage and testing
-async def main():
+def main():
     """Test the predictive maintenance engine"""
     
     # Initialize the engine
@@ -466,4 +765,4 @@ async def main():
                 print(f"  - {item.equipment_id} ({item.risk_level} risk)")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()